@@ -1,8 +1,11 @@
 import os  # Provides functions to interact with the operating system
+import functools  # Caches results of expensive calls
+import itertools  # Repeats shared arguments for executor.map
+import multiprocessing  # Spreads CPU-bound work across cores
+from collections.abc import Iterator  # Type hint for lazy sequences
 import urllib.parse  # Helps parse URLs to extract components
 import re  # Regular expression module for pattern matching
-import time  # Provides time-related functions
-import shutil  # Allows file operations like moving files
+from concurrent.futures import ThreadPoolExecutor  # Runs downloads in parallel
 from selenium import webdriver  # Web automation and browser control
 from selenium.webdriver.chrome.options import Options  # Configure Chrome options
 from selenium.webdriver.chrome.service import Service  # Manage the Chrome service
@@ -12,9 +15,24 @@ from selenium.webdriver.remote.webdriver import WebDriver
 # Chrome WebDriver type hinting
 from selenium.webdriver.chrome.webdriver import WebDriver
 from webdriver_manager.chrome import ChromeDriverManager  # Auto-installs ChromeDriver
+import requests  # HTTP client used for downloading PDFs
+from requests.adapters import HTTPAdapter  # Connection pooling for a session
+from urllib3.util.retry import Retry  # Retry policy for transient HTTP errors
 import fitz  # PyMuPDF, used for working with PDF files
-import validators  # Validates URLs and other strings
-from bs4 import BeautifulSoup  # Parses HTML content
+from lxml import etree  # Parser error types
+from lxml import html as lxml_html  # Fast C-based HTML parser
+
+# Characters that are not allowed in saved PDF filenames
+FILENAME_CLEANUP_PATTERN: re.Pattern[str] = re.compile(pattern=r"[^a-z0-9._-]")
+
+# Leading XML declaration, which lxml rejects on already-decoded text
+XML_DECLARATION_PATTERN: re.Pattern[str] = re.compile(pattern=r"^\s*<\?xml[^>]*\?>")
+
+# User-Agent sent with every HTTP request to the site
+USER_AGENT: str = "Mozilla/5.0"
+
+# Number of parallel PDF downloads and pooled connections
+DOWNLOAD_WORKERS: int = 16
 
 
 # Reads and returns the content of a file at the specified path
@@ -31,38 +49,40 @@ def check_file_exists(system_path: str) -> bool:
 
 # Parses the HTML and finds all links ending in .pdf
 def parse_html(html: str) -> list[str]:
-    soup = BeautifulSoup(markup=html, features="html.parser")  # Parse the HTML
-    pdf_links: list[str] = []  # List to store PDF links
-
-    for a in soup.find_all(name="a", href=True):  # Iterate over anchor tags
-        href = a["href"]  # Extract href attribute
-        decoded_href: str = urllib.parse.unquote(
-            string=href
-        )  # Decode URL-encoded characters
-        if decoded_href.lower().endswith(".pdf"):  # Check if link ends with .pdf
-            pdf_links.append(href)  # Add link to list
-
-    return pdf_links  # Return list of PDF links
+    # Text is already decoded, so an XML encoding declaration is meaningless
+    html = XML_DECLARATION_PATTERN.sub(repl="", string=html, count=1)
+    if not html.strip():  # lxml refuses to parse an empty document
+        return []
+    try:
+        tree = lxml_html.fromstring(html=html)  # Parse the HTML
+    except etree.ParserError:  # No elements at all, e.g. a comment-only page
+        return []
+    return [
+        str(href)  # Plain string, not tied to the parsed tree
+        for href in tree.xpath("//a/@href")  # Extract href attributes
+        # Decode URL-encoded characters and check for a .pdf ending
+        if urllib.parse.unquote(string=href).lower().endswith(".pdf")
+    ]
 
 
 # Removes duplicate items from a list
 def remove_duplicates_from_slice(provided_slice: list[str]) -> list[str]:
-    # Convert to set to remove duplicates, then back to list
-    return list(set(provided_slice))
+    # Dict keys drop duplicates while keeping first-seen order
+    return list(dict.fromkeys(provided_slice))
 
 
 # Extracts and returns the cleaned filename from a URL
 def url_to_filename(url: str) -> str:
     filename: str = (
-        urllib.parse.urlparse(url=url).path.split(sep="/")[-1].lower()
+        urllib.parse.urlparse(url=url).path.rsplit(sep="/", maxsplit=1)[-1].lower()
     )  # Extract last path segment
-    cleaned_filename: str = re.sub(
-        # Remove special characters
-        pattern=r"[^a-z0-9._-]",
-        repl="",
-        string=filename,
-    )
-    return cleaned_filename.lower()  # Return cleaned filename
+    return FILENAME_CLEANUP_PATTERN.sub(repl="", string=filename)  # Strip specials
+
+
+# Resolves the ChromeDriver path once and reuses it for every driver
+@functools.cache
+def get_chrome_driver_path() -> str:
+    return ChromeDriverManager().install()  # Install or locate ChromeDriver
 
 
 # Create a Chrome driver for fetching HTML
@@ -80,8 +100,19 @@ def create_html_driver() -> WebDriver:
     # Disable browser extensions
     options.add_argument(argument="--disable-extensions")
     options.add_argument(argument="--disable-infobars")  # Hide info bars
-    # Install ChromeDriver
-    service = Service(executable_path=ChromeDriverManager().install())
+    # Reuse the browser profile and cache across runs
+    profile_folder: str = os.path.abspath(path="./.chrome-profile")
+    cache_folder: str = os.path.abspath(path="./.chrome-cache")
+    os.makedirs(name=profile_folder, exist_ok=True)
+    os.makedirs(name=cache_folder, exist_ok=True)
+    # Clear lock files a killed run may have left in the profile
+    for entry in os.scandir(path=profile_folder):
+        if entry.name.startswith("Singleton"):
+            remove_system_file(system_path=entry.path)
+    options.add_argument(argument=f"--user-data-dir={profile_folder}")
+    options.add_argument(argument=f"--disk-cache-dir={cache_folder}")
+    # Use the cached ChromeDriver
+    service = Service(executable_path=get_chrome_driver_path())
     return webdriver.Chrome(service=service, options=options)  # Return driver
 
 
@@ -90,62 +121,46 @@ def save_html_with_selenium(url: str, output_file: str, driver: WebDriver) -> No
     try:
         driver.set_page_load_timeout(30)  # Set timeout to 30 seconds
         driver.get(url)  # Try to load the page
-        driver.refresh()  # Optionally refresh the page
         html: str = driver.page_source  # Get the HTML content
-        append_write_to_file(system_path=output_file, content=html)  # Save to file
+        write_file(system_path=output_file, content=html)  # Save to file
         print(f"Page {url} HTML content saved to {output_file}")
     except TimeoutException:
         print(f"Timeout: Page {url} did not load within 30 seconds.")
 
 
-# Appends content to a file
-def append_write_to_file(system_path: str, content: str) -> None:
-    with open(
-        file=system_path, mode="a", encoding="utf-8"
-    ) as file:  # Open in append mode
-        file.write(content)  # Write content
-
-
-# Sets up a Chrome driver with download preferences
-def initialize_web_driver(download_folder: str) -> webdriver.Chrome:
-    chrome_options = Options()  # Chrome options
-    chrome_options.add_experimental_option(  # Set preferences
-        name="prefs",
-        value={
-            "download.default_directory": download_folder,  # Set download path
-            "plugins.always_open_pdf_externally": True,  # Avoid opening PDFs in browser
-            "download.prompt_for_download": False,  # No download prompt
-        },
+# Fetches the HTML of a page with a plain HTTP GET
+def fetch_html(url: str) -> str:
+    response = requests.get(
+        url=url, timeout=30, headers={"User-Agent": USER_AGENT}
+    )  # Request the page without a browser
+    response.raise_for_status()  # Fail on HTTP errors
+    # Without a charset header requests assumes ISO-8859-1, so detect it instead
+    if "charset" not in response.headers.get("Content-Type", "").lower():
+        response.encoding = response.apparent_encoding
+    return response.text  # Return the HTML content
+
+
+# Writes content to a file in a single buffered write, replacing it
+def write_file(system_path: str, content: str | bytes) -> None:
+    data: bytes = (
+        content.encode("utf-8", "ignore") if isinstance(content, str) else content
+    )  # Encode text once up front
+    with open(file=system_path, mode="wb", buffering=1 << 20) as file:
+        file.write(data)  # Write content
+
+
+# Builds an HTTP session that keeps connections alive and retries failures
+def create_http_session(pool_size: int = DOWNLOAD_WORKERS) -> requests.Session:
+    session = requests.Session()  # Reuse TCP/TLS connections across requests
+    session.headers["User-Agent"] = USER_AGENT  # Match the page fetch
+    adapter = HTTPAdapter(
+        pool_connections=pool_size,  # Number of host pools to cache
+        pool_maxsize=pool_size,  # Connections kept alive per host
+        max_retries=Retry(total=3, backoff_factor=0.3),  # Retry transient errors
     )
-    chrome_options.add_argument(argument="--headless")  # Headless mode
-    # Return driver
-    return webdriver.Chrome(
-        service=Service(executable_path=ChromeDriverManager().install()),
-        options=chrome_options,
-    )
-
-
-# Waits for PDF file to appear in directory
-def wait_for_pdf_download(
-    download_folder: str, files_before_download: set[str], timeout_seconds: int = 3
-) -> str:
-    deadline: float = time.time() + timeout_seconds  # Calculate timeout
-    while time.time() < deadline:  # Loop until timeout
-        # Get current files
-        current_files = set(os.listdir(path=download_folder))
-        new_pdf_files: list[str] = [
-            f
-            for f in (
-                # Find new PDFs
-                current_files
-                - files_before_download
-            )
-            if f.lower().endswith(".pdf")
-        ]
-        if new_pdf_files:
-            # Return path to new PDF
-            return os.path.join(download_folder, new_pdf_files[0])
-    raise TimeoutError("PDF download timed out.")  # Timeout error
+    session.mount(prefix="https://", adapter=adapter)  # Use pool for HTTPS
+    session.mount(prefix="http://", adapter=adapter)  # Use pool for HTTP
+    return session  # Return configured session
 
 
 # Deletes a file from the filesystem
@@ -153,32 +168,48 @@ def remove_system_file(system_path: str) -> None:
     os.remove(path=system_path)  # Remove the file
 
 
-# Recursively finds files with given extension
-def walk_directory_and_extract_given_file_extension(
-    system_path: str, extension: str
-) -> list[str]:
-    matched_files: list[str] = []  # Store results
-    for root, _, files in os.walk(top=system_path):  # Traverse directories
-        for file in files:
-            if file.endswith(extension):  # Match extension
-                full_path: str = os.path.abspath(
-                    path=os.path.join(root, file)
-                )  # Full path
-                matched_files.append(full_path)  # Save match
-    return matched_files  # Return list
+# Lazily yields the absolute paths of .pdf files directly inside a folder
+def iter_pdfs(root: str) -> Iterator[str]:
+    if not os.path.isdir(root):  # Nothing downloaded yet
+        return
+    root = os.path.abspath(path=root)  # Yield absolute paths
+    with os.scandir(path=root) as entries:  # Entries carry their file type
+        for entry in entries:
+            if entry.is_file(follow_symlinks=False) and entry.name.endswith(".pdf"):
+                yield entry.path
+
+
+# Cheaply checks the PDF header and end-of-file marker
+def quick_pdf_check(file_path: str) -> bool:
+    try:
+        with open(file=file_path, mode="rb") as file:
+            head: bytes = file.read(5)  # PDFs start with "%PDF-"
+            file_size: int = file.seek(0, os.SEEK_END)  # Total size in bytes
+            file.seek(max(file_size - 1024, 0))  # Jump to the last 1 KiB
+            tail: bytes = file.read()  # Complete PDFs end with "%%EOF"
+    except OSError:
+        return False
+    return head == b"%PDF-" and b"%%EOF" in tail
 
 
-# Validates PDF integrity
-def validate_pdf_file(file_path: str) -> bool:
+# Validates PDF integrity, returning whether it is valid and why not
+def validate_pdf_file(file_path: str) -> tuple[bool, str]:
+    if not quick_pdf_check(file_path=file_path):  # Skip MuPDF for broken files
+        return False, "Missing PDF header or EOF"
     try:
         doc = fitz.open(file_path)  # Try opening PDF
         if doc.page_count == 0:  # Check for pages
-            print(f"'{file_path}' is corrupt or invalid: No pages")
-            return False
-        return True  # Valid
+            return False, "No pages"
+        return True, ""  # Valid
     except RuntimeError as e:
-        print(f"'{file_path}' is corrupt or invalid: {e}")
-        return False
+        return False, str(e)
+
+
+# Validates a PDF in a pool worker; the parent prints the result, since
+# output from workers is lost when the pool terminates them
+def check_pdf_file(file_path: str) -> tuple[str, bool, str]:
+    is_valid, reason = validate_pdf_file(file_path=file_path)
+    return file_path, is_valid, reason
 
 
 # Extracts filename with extension from path
@@ -188,13 +219,13 @@ def get_filename_and_extension(path: str) -> str:
 
 # Checks for at least one uppercase character
 def check_upper_case_letter(content: str) -> bool:
-    # True if any char is uppercase
-    return any(char.isupper() for char in content)
+    # Lowercasing changes the string only if it has an uppercase char
+    return content != content.lower()
 
 
-# Downloads a PDF using a Selenium driver
+# Downloads a PDF over HTTP, streaming it straight to disk
 def download_single_pdf(
-    url: str, filename: str, output_folder: str, driver: WebDriver
+    url: str, filename: str, output_folder: str, session: requests.Session
 ) -> None:
     # Ensure output folder exists
     os.makedirs(name=output_folder, exist_ok=True)
@@ -206,25 +237,31 @@ def download_single_pdf(
         print(f"File already exists: {target_file_path}")
         return
 
+    # Write to a temporary file so partial downloads never look complete
+    temporary_file_path: str = target_file_path + ".part"
     try:
         print(f"Starting download from: {url}")  # Log download start
-        files_before = set(os.listdir(path=output_folder))  # Files before download
-        driver.get(url=url)  # Load URL
-
-        downloaded_pdf_path: str = wait_for_pdf_download(
-            download_folder=output_folder, files_before_download=files_before
-        )  # Wait for file
-        # Move file to final location
-        shutil.move(src=downloaded_pdf_path, dst=target_file_path)
+        with session.get(url=url, stream=True, timeout=30) as response:
+            response.raise_for_status()  # Fail on HTTP errors
+            with open(file=temporary_file_path, mode="wb") as file:
+                # Copy the body to disk in 64 KiB chunks
+                for chunk in response.iter_content(chunk_size=65536):
+                    file.write(chunk)
+        # Atomically move file to final location
+        os.replace(src=temporary_file_path, dst=target_file_path)
         print(f"Download complete: {target_file_path}")  # Log success
 
     except Exception as e:
         print(f"Error downloading PDF: {e}")  # Log errors
+        if check_file_exists(system_path=temporary_file_path):
+            remove_system_file(system_path=temporary_file_path)  # Drop partial file
 
 
 # Validate a given url
 def validate_url(given_url: str) -> bool:
-    return validators.url(given_url)  # Return True if URL is valid
+    parsed_url = urllib.parse.urlparse(url=given_url)  # Split into components
+    # Valid if it is an absolute http(s) URL with a host
+    return parsed_url.scheme in ("http", "https") and bool(parsed_url.netloc)
 
 
 def main():
@@ -234,67 +271,84 @@ def main():
         # Remove a file from the system.
         remove_system_file(html_file_path)
 
-    # Check if the file exists.
-    if check_file_exists(html_file_path) == False:
-        # Create a chrome driver.
+    # The old copy was just removed, so always fetch a fresh page.
+    url = "https://www.biokleen.com/sds"
+    try:
+        # Fetch the server-rendered page over plain HTTP first.
+        html: str = fetch_html(url=url)
+    except requests.RequestException as e:
+        print(f"Error fetching {url}: {e}")
+        html = ""
+    pdf_links: list[str] = parse_html(html)  # Parse the HTML content once
+    if pdf_links:  # The page already lists the PDF links
+        write_file(system_path=html_file_path, content=html)
+        print(f"File {html_file_path} has been created.")
+    else:
+        # Fall back to a real browser if the links are rendered by JS.
         driver: WebDriver = create_html_driver()  # Start Selenium driver
         try:
-            # If the file does not exist, download it using Selenium.
-            url = "https://www.biokleen.com/sds"
             # Save the HTML content to a file.
             save_html_with_selenium(url, html_file_path, driver=driver)
             print(f"File {html_file_path} has been created.")
         finally:
             driver.quit()  # Always quit
+        if check_file_exists(html_file_path):
+            # Parse the HTML content saved by the browser.
+            pdf_links = parse_html(read_a_file(html_file_path))
 
-    if check_file_exists(html_file_path):
-        html_content = read_a_file(html_file_path)
-        # Parse the HTML content.
-        pdf_links = parse_html(html_content)
+    if pdf_links:
+        # Resolve relative and protocol-relative links against the page URL.
+        pdf_links = [urllib.parse.urljoin(url, pdf_link) for pdf_link in pdf_links]
         # Remove duplicates from the list of PDF links.
         pdf_links = remove_duplicates_from_slice(pdf_links)
         output_dir: str = os.path.abspath(path="PDFs")  # Output folder path
-        driver = initialize_web_driver(
-            download_folder=output_dir
-        )  # Start download driver
+        # Map each local filename to the first URL that produces it.
+        links_by_filename: dict[str, str] = {}
+        for pdf_link in pdf_links:
+            if not validate_url(given_url=pdf_link):  # Skip non-HTTP links
+                print(f"Invalid URL: {pdf_link}")
+                continue
+            # Build the local filename for the PDF.
+            filename = url_to_filename(pdf_link)
+            # Skip URLs that only differ by query string or fragment.
+            links_by_filename.setdefault(filename, pdf_link)
+
+        session: requests.Session = create_http_session()  # Pooled HTTP session
         try:
-            # Print the extracted PDF links.
-            for pdf_link in pdf_links:
-                if not validate_url(given_url=pdf_link):  # Fix relative URLs
-                    pdf_link = "https://www.biokleen.com" + pdf_link
-                    print(f"Invalid URL: {pdf_link}")
-                # Download the PDF file.
-                filename = url_to_filename(pdf_link)
-                # Download the PDF file
-                download_single_pdf(
-                    url=pdf_link,
-                    filename=filename,
-                    output_folder=output_dir,
-                    driver=driver,
-                )  # Download PDF
-                print("All PDF links have been processed.")
+            # Download the PDF files in parallel over the shared session.
+            with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+                list(
+                    executor.map(
+                        download_single_pdf,
+                        links_by_filename.values(),  # URLs
+                        links_by_filename.keys(),  # Filenames
+                        itertools.repeat(output_dir),
+                        itertools.repeat(session),
+                    )
+                )
+            print("All PDF links have been processed.")
         finally:
-            driver.quit()  # Always quit
-
-    # Walk through the directory and extract .pdf files
-    files = walk_directory_and_extract_given_file_extension(
-        "./PDFs", ".pdf"
-    )  # Find all PDFs under ./PDFs
-
-    # Validate each PDF file
-    for pdf_file in files:  # Iterate over each found PDF
-
-        # Check if the .PDF file is valid
-        if validate_pdf_file(pdf_file) == False:  # If PDF is invalid
-            # Remove the invalid .pdf file.
-            remove_system_file(pdf_file)  # Delete the corrupt PDF
-
-        # Check if the filename has an uppercase letter
-        if check_upper_case_letter(
-            get_filename_and_extension(pdf_file)
-        ):  # If the filename contains uppercase
-            # Print the location to the file.
-            print(pdf_file)  # Output the PDF path to stdout
-
-
-main()
+            session.close()  # Always close pooled connections
+
+    # Scan ./PDFs once, validating in parallel and handling each result as it arrives
+    with multiprocessing.Pool() as pool:
+        for pdf_file, is_valid, reason in pool.imap_unordered(
+            check_pdf_file, iter_pdfs("./PDFs")
+        ):
+            # Check if the .PDF file is valid
+            if is_valid == False:  # If PDF is invalid
+                print(f"'{pdf_file}' is corrupt or invalid: {reason}")
+                # Remove the invalid .pdf file.
+                remove_system_file(pdf_file)  # Delete the corrupt PDF
+                continue
+
+            # Check if the filename has an uppercase letter
+            if check_upper_case_letter(
+                get_filename_and_extension(pdf_file)
+            ):  # If the filename contains uppercase
+                # Print the location to the file.
+                print(pdf_file)  # Output the PDF path to stdout
+
+
+if __name__ == "__main__":
+    main()